@@ -12,13 +12,18 @@ from __future__ import annotations
 
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 import click
 
-try:
-    import util
-except ModuleNotFoundError:
-    import cupid.util as util
+
+def _import_util():
+    """Import cupid.util, which is only needed once the command runs"""
+    try:
+        import util
+    except ModuleNotFoundError:
+        import cupid.util as util
+    return util
 
 
 def read_config_file(config_path):
@@ -33,7 +38,7 @@ def read_config_file(config_path):
         None
     """
     # Obtain the contents of the configuration file and extract the run_dir variable
-    control = util.get_control_dict(config_path)
+    control = _import_util().get_control_dict(config_path)
     run_dir = control["data_sources"].get("run_dir", None)
 
     if run_dir:
@@ -45,6 +50,35 @@ def read_config_file(config_path):
     raise ValueError("'run_dir' was empty/not found in the config file.")
 
 
+def parallel_rmtree(path, max_workers=16):
+    """
+    Delete a directory tree, removing its top-level entries concurrently.
+
+    File system calls release the GIL, so overlapping them hides the per-call
+    latency of networked file systems such as GLADE.
+
+    Args:
+        path: str, directory to delete
+        max_workers: int, number of threads used for the deletion
+
+    Returns:
+        None
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        with os.scandir(path) as entries:
+            futures = [
+                executor.submit(
+                    shutil.rmtree if entry.is_dir(follow_symlinks=False) else os.remove,
+                    entry.path,
+                )
+                for entry in entries
+            ]
+    # re-raise any error from the worker threads
+    for future in futures:
+        future.result()
+    os.rmdir(path)
+
+
 @click.command()
 @click.argument("config_path", default="config.yml")
 # Entry point to this script
@@ -55,10 +89,14 @@ def clean(config_path):
     Args: CONFIG_PATH - The path to the configuration file.
 
     """
-    logger = util.setup_logging(config_path)
+    logger = _import_util().setup_logging(config_path)
     run_dir = read_config_file(config_path)
+    # Nothing to do if the notebooks have not been computed (or were already cleaned)
+    if not os.path.isdir(run_dir):
+        logger.info(f"{run_dir} does not exist; nothing to clean.")
+        return
     # Delete the "computed_notebooks" folder and all the contents inside of it
-    shutil.rmtree(run_dir)
+    parallel_rmtree(run_dir)
     logger.info(f"All contents in {run_dir} have been cleaned.")
 
 
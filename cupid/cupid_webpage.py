@@ -6,7 +6,8 @@ the configuration specified in a YAML file.
 The main function `build()` reads the configuration file (default config.yml),
 extracts the necessary information such as the name of the book and the
 directory containing computed notebooks, and then proceeds to clean and build
-the Jupyter book using the `jupyter-book` command-line tool.
+the Jupyter book. Cleaning is done in-process; the build uses the `jupyter-book`
+command-line tool.
 
 Args:
     CONFIG_PATH: str, path to configuration file (default config.yml)
@@ -16,11 +17,28 @@ Returns:
 """
 from __future__ import annotations
 
+import os
 import shutil
-import subprocess
 
 import click
-import yaml
+
+# external tools whose output, in {run_dir}/{tool_name}_output, is added to the webpage
+WEBPAGE_TOOLS = ("ADF",)
+
+
+def clean_book(book_dir):
+    """
+    Remove the build outputs of the Jupyter book in book_dir.
+
+    Equivalent to `jupyter-book clean`: the directories in _build are deleted
+    except the execution cache, but without starting a separate Python process.
+    """
+    build_dir = os.path.join(book_dir, "_build")
+    if not os.path.isdir(build_dir):
+        return
+    for entry in os.scandir(build_dir):
+        if entry.name != ".jupyter_cache" and entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
 
 
 @click.command()
@@ -35,29 +53,42 @@ def build(config_path):
     Returns:
         None
     """
+    import subprocess
+
+    try:
+        from read import read_yaml
+        from _fastcopy import fast_copytree
+    except ModuleNotFoundError:
+        from cupid.read import read_yaml
+        from cupid._fastcopy import fast_copytree
 
-    with open(config_path) as fid:
-        control = yaml.safe_load(fid)
+    control = read_yaml(config_path)
 
     run_dir = control["data_sources"]["run_dir"]
 
-    subprocess.run(["jupyter-book", "clean", f"{run_dir}/computed_notebooks"])
+    clean_book(f"{run_dir}/computed_notebooks")
     subprocess.run(
         ["jupyter-book", "build", f"{run_dir}/computed_notebooks", "--all"],
     )
-    for component in control["compute_notebooks"]:
-        for notebook in control["compute_notebooks"][component]:
-            if "external_tool" in control["compute_notebooks"][component][notebook]:
-                if (
-                    control["compute_notebooks"][component][notebook][
-                        "external_tool"
-                    ].get("tool_name")
-                    == "ADF"
-                ):
-                    shutil.copytree(
-                        f"{run_dir}/ADF_output",
-                        f"{run_dir}/computed_notebooks/_build/html/ADF",
-                    )
+    # add the output of external tools to the webpage, once per tool
+    html_dir = f"{run_dir}/computed_notebooks/_build/html"
+    # tools already looked for, so each output directory is checked (and
+    # reported missing) only once however many notebooks use the tool
+    tools_checked = set()
+    for notebooks in control["compute_notebooks"].values():
+        for info in notebooks.values():
+            tool_name = (info.get("external_tool") or {}).get("tool_name")
+            if tool_name not in WEBPAGE_TOOLS or tool_name in tools_checked:
+                continue
+            tools_checked.add(tool_name)
+            tool_output = f"{run_dir}/{tool_name}_output"
+            if not os.path.isdir(tool_output):
+                print(
+                    f"WARNING: {tool_output} not found;"
+                    + " it will not be added to the webpage.",
+                )
+                continue
+            fast_copytree(tool_output, f"{html_dir}/{tool_name}", dirs_exist_ok=True)
 
     # Originally used this code to copy jupyter book HTML to a location to host it online
 
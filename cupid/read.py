@@ -2,37 +2,98 @@
 This module provides functions for reading YAML files and working with intake catalogs.
 
 Functions:
-    - read_yaml(path_to_yaml): Read a YAML file and return its content as a dictionary.
+    - read_yaml(path_to_yaml): Read a YAML file and return its content as a dictionary,
+                     reusing the parsed result if the file is unchanged.
+    - open_catalog(path_to_catalog): Open an intake-esm catalog, once per path.
     - get_collection(path_to_catalog, **kwargs): Get a collection of datasets from an
-                     intake catalog based on specified criteria.
+                     intake catalog based on specified criteria, reusing the opened
+                     catalog of earlier calls.
 """
 from __future__ import annotations
 
-import intake
+import functools
+import os
+
 import yaml
 
+# Use the libyaml-backed loader when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
-def read_yaml(path_to_yaml):
-    """Read yaml file and return data from loaded yaml file"""
-    with open(path_to_yaml) as file:
-        data = yaml.load(file, Loader=yaml.FullLoader)
+
+def _copy_yaml_data(data):
+    """
+    Copy the dicts and lists of data parsed from YAML.
+
+    Much cheaper than copy.deepcopy, which has to keep a memo of every object it
+    visits; the remaining YAML types (str, int, float, bool, None, dates) are
+    immutable and can be shared.
+    """
+    if isinstance(data, dict):
+        return {key: _copy_yaml_data(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_copy_yaml_data(value) for value in data]
     return data
 
 
+@functools.lru_cache(maxsize=8)
+def _parse_yaml(realpath, mtime_ns, size):
+    """Parse a YAML file; the stat-based arguments key the cache."""
+    with open(realpath, "rb") as fid:
+        return yaml.load(fid, Loader=_YAML_LOADER)
+
+
+def read_yaml(path_to_yaml):
+    """
+    Read yaml file and return data from loaded yaml file.
+
+    The parsed contents are cached in memory by (real path, modification time,
+    size), so repeated reads of an unchanged file skip the YAML parse. A copy of the
+    cached data is returned because callers are free to modify the result.
+    """
+    stat = os.stat(path_to_yaml)
+    data = _parse_yaml(
+        os.path.realpath(path_to_yaml),
+        stat.st_mtime_ns,
+        stat.st_size,
+    )
+    return _copy_yaml_data(data)
+
+
+@functools.lru_cache(maxsize=8)
+def open_catalog(path_to_catalog):
+    """
+    Open an intake-esm catalog, parsing its JSON and CSV files once per path.
+
+    Call open_catalog.cache_clear() if the catalog files change while the
+    process is running.
+    """
+    # imported here so that reading YAML files does not require loading intake
+    import intake
+
+    return intake.open_esm_datastore(path_to_catalog)
+
+
 def get_collection(path_to_catalog, **kwargs):
-    """Get collection of datasets from intake catalog"""
-    cat = intake.open_esm_datastore(path_to_catalog)
+    """
+    Get collection of datasets from intake catalog
+
+    The opened catalog is cached, so repeated calls with the same catalog do
+    not re-read it; call open_catalog.cache_clear() if the catalog files change
+    while the process is running.
+    """
     # note that the json file points to the csv, so the path that the
     # yaml file contains does not actually get used. this can cause issues
 
-    cat_subset = cat.search(**kwargs)
+    cat_subset = open_catalog(path_to_catalog).search(**kwargs)
 
     if "variable" in kwargs.keys():
+        # the double brackets return a Dataset rather than a DataArray
+        # this is fragile and could cause issues, not sure what subsetting on time_bound does
+        vars_to_keep = [kwargs["variable"], "time_bound"]
+
         # pylint: disable=invalid-name
         def preprocess(ds):
-            # the double brackets return a Dataset rather than a DataArray
-            # this is fragile and could cause issues, not sure what subsetting on time_bound does
-            return ds[[kwargs["variable"], "time_bound"]]
+            return ds[vars_to_keep]
 
         # not sure what the chunking kwarg is doing here either
         dsets = cat_subset.to_dataset_dict(
@@ -10,7 +10,7 @@ Usage: cupid-diagnostics [OPTIONS]
   Main engine to set up running all the notebooks.
 
 Options:
-  -s, --serial        Do not use LocalCluster objects
+  -s, --serial        Run notebooks one at a time and do not use LocalCluster objects
   -atm, --atmosphere  Run atmosphere component diagnostics
   -ocn, --ocean       Run ocean component diagnostics
   -lnd, --land        Run land component diagnostics
@@ -22,25 +22,90 @@ Options:
 """
 from __future__ import annotations
 
+import functools
+import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import click
-import intake
-import ploomber
-
-try:
-    import util
-except ModuleNotFoundError:
-    import cupid.util as util
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 
+
+@functools.lru_cache(maxsize=None)
+def _realpath(path):
+    """os.path.realpath(os.path.expanduser(path)), resolving each path only once"""
+    return os.path.realpath(os.path.expanduser(path))
+
+
+def _subset_hash(full_cat_path, subset_kwargs):
+    """
+    Hash of the subset search and the state of the full catalog it is taken from:
+    the catalog JSON and the CSV named by its catalog_file, which holds the rows.
+
+    Returns None if the CSV cannot be stat-ed (e.g. it is a URL or is inlined
+    in the JSON), in which case the subset is always written again.
+    """
+    with open(full_cat_path) as fid:
+        catalog_file = json.load(fid).get("catalog_file")
+    if not catalog_file:
+        return None
+    catalog_file = os.path.join(os.path.dirname(full_cat_path), catalog_file)
+    key = json.dumps(subset_kwargs, sort_keys=True, default=str)
+    for path in (full_cat_path, catalog_file):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key += f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def _write_subset_catalog(cat_subset, directory, name, subset_hash):
+    """Serialize cat_subset, then record the hash it was made from next to it"""
+    hash_path = os.path.join(directory, f"{name}.hash")
+    # a stale hash must not outlive a failed write
+    if os.path.exists(hash_path):
+        os.remove(hash_path)
+    cat_subset.serialize(directory=directory, name=name, catalog_type="file")
+    if subset_hash is not None:
+        with open(hash_path, "w") as fid:
+            fid.write(subset_hash)
+
+
+def _env_is_installed(task_file, info, installed_envs, logger):
+    """
+    Check that the environment requested for a notebook or script is installed;
+    if it is not, log a warning that task_file will not be run.
+    """
+    if info["kernel_name"] in installed_envs:
+        return True
+    logger.warning(
+        f"Environment {info['kernel_name']} specified for {task_file} could not be found;"
+        + f" {task_file} will not be run."
+        + " See README.md for environment installation instructions.",
+    )
+    return False
+
+
+def _prefetch(path):
+    """Read a file so it is in the page cache when its task is set up"""
+    try:
+        with open(path, "rb") as fid:
+            while fid.read(1 << 20):
+                pass
+    except OSError:
+        # a missing input is reported when its task is created
+        pass
+
+
 # fmt: off
 # pylint: disable=line-too-long
 
 
 @click.command(context_settings=CONTEXT_SETTINGS)
-@click.option("--serial", "-s", is_flag=True, help="Do not use LocalCluster objects")
+@click.option("--serial", "-s", is_flag=True, help="Run notebooks one at a time and do not use LocalCluster objects")
 # Options to turn components on or off
 @click.option("--atmosphere", "-atm", is_flag=True, help="Run atmosphere component diagnostics")
 @click.option("--ocean", "-ocn", is_flag=True, help="Run ocean component diagnostics")
@@ -72,10 +137,19 @@ def run_diagnostics(
     """
     # fmt: on
     # pylint: enable=line-too-long
+    import ploomber
+
+    try:
+        import read
+        import util
+    except ModuleNotFoundError:
+        import cupid.read as read
+        import cupid.util as util
+
     # Get control structure
     control = util.get_control_dict(config_path)
-    util.setup_book(config_path)
-    logger = util.setup_logging(config_path)
+    util.setup_book(config_path, control=control)
+    logger = util.setup_logging(config_path, control=control)
 
     component_options = {
         "atm": atmosphere,
@@ -88,18 +162,14 @@ def run_diagnostics(
 
     # Automatically run all if no components specified
 
-    if True not in [atmosphere, ocean, land, seaice, landice, river_runoff]:
+    if not any(component_options.values()):
         all = True
-        for key in component_options.keys():
-            component_options[key] = True
+        component_options = dict.fromkeys(component_options, True)
 
     #####################################################################
     # Managing global parameters
 
-    global_params = dict()
-
-    if "global_params" in control:
-        global_params = control["global_params"]
+    global_params = control.get("global_params", dict())
 
     global_params["serial"] = serial
 
@@ -107,12 +177,11 @@ def run_diagnostics(
 
     # Grab paths
 
-    run_dir = os.path.realpath(os.path.expanduser(control["data_sources"]["run_dir"]))
-    output_dir = run_dir + "/computed_notebooks/"
-    temp_data_path = run_dir + "/temp_data"
-    nb_path_root = os.path.realpath(
-        os.path.expanduser(control["data_sources"]["nb_path_root"]),
-    )
+    data_sources = control["data_sources"]
+    run_dir = _realpath(data_sources["run_dir"])
+    output_dir = os.path.join(run_dir, "computed_notebooks")
+    temp_data_path = os.path.join(run_dir, "temp_data")
+    nb_path_root = _realpath(data_sources["nb_path_root"])
 
     #####################################################################
     # Managing catalog-related stuff
@@ -120,124 +189,174 @@ def run_diagnostics(
     # Access catalog if it exists
 
     cat_path = None
+    cat_serialized = None
 
-    if "path_to_cat_json" in control["data_sources"]:
-        full_cat_path = os.path.realpath(
-            os.path.expanduser(control["data_sources"]["path_to_cat_json"]),
-        )
-        full_cat = intake.open_esm_datastore(full_cat_path)
+    path_to_cat_json = data_sources.get("path_to_cat_json")
+    if path_to_cat_json is not None:
+        full_cat_path = _realpath(path_to_cat_json)
 
         # Doing initial subsetting on full catalog, e.g. to only use certain cases
 
-        if "subset" in control["data_sources"]:
-            first_subset_kwargs = control["data_sources"]["subset"]
-            cat_subset = full_cat.search(**first_subset_kwargs)
+        first_subset_kwargs = data_sources.get("subset")
+        if first_subset_kwargs is not None:
             # This pulls out the name of the catalog from the path
-            cat_subset_name = full_cat_path.split("/")[-1].split(".")[0] + "_subset"
-            cat_subset.serialize(
-                directory=temp_data_path, name=cat_subset_name, catalog_type="file",
-            )
-            cat_path = temp_data_path + "/" + cat_subset_name + ".json"
+            cat_subset_name = os.path.basename(full_cat_path).split(".", 1)[0] + "_subset"
+            cat_path = os.path.join(temp_data_path, f"{cat_subset_name}.json")
+
+            # a subset written by an earlier run can be reused if neither the
+            # search nor the full catalog has changed since
+            subset_hash = _subset_hash(full_cat_path, first_subset_kwargs)
+            subset_is_current = False
+            subset_csv = os.path.join(temp_data_path, f"{cat_subset_name}.csv")
+            if subset_hash is not None and os.path.isfile(cat_path) and os.path.isfile(subset_csv):
+                try:
+                    with open(os.path.join(temp_data_path, f"{cat_subset_name}.hash")) as fid:
+                        subset_is_current = fid.read() == subset_hash
+                except OSError:
+                    pass
+
+            if not subset_is_current:
+                cat_subset = read.open_catalog(full_cat_path).search(**first_subset_kwargs)
+                # write the subset catalog in the background while the tasks are set up;
+                # its path is known up front and it is only read once the DAG runs
+                catalog_writer = ThreadPoolExecutor(max_workers=1)
+                cat_serialized = catalog_writer.submit(
+                    _write_subset_catalog,
+                    cat_subset, temp_data_path, cat_subset_name, subset_hash,
+                )
+                catalog_writer.shutdown(wait=False)
         else:
             cat_path = full_cat_path
 
     #####################################################################
-    # Ploomber - making a DAG
-
-    dag = ploomber.DAG(executor=ploomber.executors.Serial())
-
-    #####################################################################
-    # Organizing notebooks to run
-
-    if "compute_notebooks" in control:
+    # Organizing notebooks and scripts to run, skipping any whose environment
+    # is not installed
 
-        all_nbs = dict()
+    compute_notebooks = control.get("compute_notebooks")
+    compute_scripts = control.get("compute_scripts")
+    # environments found by get_control_dict; anything else is treated as missing
+    installed_envs = {env for env, found in control["env_check"].items() if found}
+    all_nbs = dict()
+    all_scripts = dict()
 
+    if compute_notebooks is not None:
         # pylint: disable=invalid-name
-        for nb, info in control["compute_notebooks"]["infrastructure"].items():
-            all_nbs[nb] = info
-            all_nbs[nb]["nb_path_root"] = nb_path_root + "/infrastructure"
-            all_nbs[nb]["output_dir"] = output_dir + "/infrastructure"
-
-        for comp_name, comp_bool in component_options.items():
-            if comp_name in control["compute_notebooks"] and comp_bool:
-                for nb, info in control["compute_notebooks"][comp_name].items():
-                    all_nbs[nb] = info
-                    all_nbs[nb]["nb_path_root"] = nb_path_root + "/" + comp_name
-                    all_nbs[nb]["output_dir"] = output_dir + "/" + comp_name
-            elif comp_bool and not all:
+        infra_nb_path_root = os.path.join(nb_path_root, "infrastructure")
+        infra_output_dir = os.path.join(output_dir, "infrastructure")
+        for nb, info in compute_notebooks["infrastructure"].items():
+            if _env_is_installed(f"{nb}.ipynb", info, installed_envs, logger):
+                info["nb_path_root"] = infra_nb_path_root
+                info["output_dir"] = infra_output_dir
+                all_nbs[nb] = info
+
+    # a single pass over the components collects both notebooks and scripts
+    for comp_name, comp_bool in component_options.items():
+        if not comp_bool:
+            continue
+        comp_nb_path_root = os.path.join(nb_path_root, comp_name)
+        comp_output_dir = os.path.join(output_dir, comp_name)
+
+        if compute_notebooks is not None:
+            comp_nbs = compute_notebooks.get(comp_name)
+            if comp_nbs is not None:
+                for nb, info in comp_nbs.items():
+                    if _env_is_installed(f"{nb}.ipynb", info, installed_envs, logger):
+                        info["nb_path_root"] = comp_nb_path_root
+                        info["output_dir"] = comp_output_dir
+                        all_nbs[nb] = info
+            elif not all:
                 logger.warning(
                     f"No notebooks for {comp_name} component specified in config file.",
                 )
 
-        # Checking for existence of environments
-
-        for nb, info in all_nbs.copy().items():
-            if not control["env_check"][info["kernel_name"]]:
-                bad_env = info["kernel_name"]
+        if compute_scripts is not None:
+            comp_scripts = compute_scripts.get(comp_name)
+            if comp_scripts is not None:
+                for script, info in comp_scripts.items():
+                    if _env_is_installed(f"{script}.py", info, installed_envs, logger):
+                        info["nb_path_root"] = comp_nb_path_root
+                        all_scripts[script] = info
+            elif not all:
                 logger.warning(
-                    f"Environment {bad_env} specified for {nb}.ipynb could not be found;" +
-                    f" {nb}.ipynb will not be run." +
-                    "See README.md for environment installation instructions.",
+                    f"No scripts for {comp_name} component specified in config file.",
                 )
-                all_nbs.pop(nb)
-
-        # Setting up notebook tasks
-
-        for nb, info in all_nbs.items():
-            util.create_ploomber_nb_task(
-                nb,
-                info,
-                cat_path,
-                info["nb_path_root"],
-                info["output_dir"],
-                global_params,
-                dag,
-                dependency=info.get("dependency"),
-            )
 
-    #####################################################################
-    # Organizing scripts
+    # Nothing to run: skip building the DAG, but let the subset catalog finish
+    if not all_nbs and not all_scripts:
+        if cat_serialized is not None:
+            cat_serialized.result()
+        logger.info("No notebooks or scripts to run.")
+        return None
 
-    if "compute_scripts" in control:
+    #####################################################################
+    # Ploomber - making a DAG
 
-        all_scripts = dict()
+    # notebooks and scripts do not depend on each other, so they can be executed
+    # in parallel; this is opt-in through max_parallel_tasks in computation_config
+    # because many notebooks start their own LocalCluster unless running in serial.
+    # There is no point in starting more processes than there are tasks.
+    max_parallel_tasks = control["computation_config"].get("max_parallel_tasks")
+    if max_parallel_tasks is not None and (
+        isinstance(max_parallel_tasks, bool)
+        or not isinstance(max_parallel_tasks, int)
+        or max_parallel_tasks < 1
+    ):
+        raise ValueError(
+            "max_parallel_tasks in computation_config must be a positive integer,"
+            + f" not {max_parallel_tasks!r}",
+        )
+    if serial or max_parallel_tasks is None:
+        executor = ploomber.executors.Serial()
+    else:
+        # each parameter group of a notebook or script becomes its own task
+        num_tasks = sum(len(info["parameter_groups"]) for info in all_nbs.values())
+        num_tasks += sum(len(info["parameter_groups"]) for info in all_scripts.values())
+        executor = ploomber.executors.Parallel(
+            processes=max(1, min(num_tasks, max_parallel_tasks)),
+        )
+    dag = ploomber.DAG(executor=executor)
+
+    # read the notebook and script sources in the background; on networked
+    # file systems this overlaps their latency with setting up the tasks below
+    input_paths = [f"{info['nb_path_root']}/{nb}.ipynb" for nb, info in all_nbs.items()]
+    input_paths += [f"{info['nb_path_root']}/{script}.py" for script, info in all_scripts.items()]
+    prefetcher = ThreadPoolExecutor(max_workers=8)
+    prefetched = [prefetcher.submit(_prefetch, path) for path in input_paths]
+    prefetcher.shutdown(wait=False)
+
+    # Setting up notebook tasks
+
+    for nb, info in all_nbs.items():
+        util.create_ploomber_nb_task(
+            nb,
+            info,
+            cat_path,
+            info["nb_path_root"],
+            info["output_dir"],
+            global_params,
+            dag,
+            dependency=info.get("dependency"),
+        )
 
-        for comp_name, comp_bool in component_options.items():
-            if comp_name in control["compute_scripts"] and comp_bool:
-                for script, info in control["compute_scripts"][comp_name].items():
-                    all_scripts[script] = info
-                    all_scripts[script]["nb_path_root"] = nb_path_root + "/" + comp_name
-            elif comp_bool and not all:
-                logger.warning(
-                    f"No scripts for {comp_name} component specified in config file.",
-                )
+    # Setting up script tasks
+
+    for script, info in all_scripts.items():
+        util.create_ploomber_script_task(
+            script,
+            info,
+            cat_path,
+            info["nb_path_root"],
+            global_params,
+            dag,
+            dependency=info.get("dependency"),
+        )
 
-        # Checking for existence of environments
+    # Run the full DAG once the subset catalog has been written
 
-        for script, info in all_scripts.copy().items():
-            if not control["env_check"][info["kernel_name"]]:
-                bad_env = info["kernel_name"]
-                logger.warning(
-                    f"Environment {bad_env} specified for {script}.py could not be found;" +
-                    f"{script}.py will not be run.",
-                )
-                all_scripts.pop(script)
-
-        # Setting up script tasks
-
-        for script, info in all_scripts.items():
-            util.create_ploomber_script_task(
-                script,
-                info,
-                cat_path,
-                info["nb_path_root"],
-                global_params,
-                dag,
-                dependency=info.get("dependency"),
-            )
-
-    # Run the full DAG
+    if cat_serialized is not None:
+        cat_serialized.result()
+    for future in prefetched:
+        future.result()
 
     dag.build()
 
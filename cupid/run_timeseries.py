@@ -22,17 +22,8 @@ Options:
 """
 from __future__ import annotations
 
-import os
-
 import click
 
-try:
-    import timeseries
-    import util
-except ModuleNotFoundError:
-    import cupid.timeseries as timeseries
-    import cupid.util as util
-
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 
 # fmt: off
@@ -71,10 +62,17 @@ def run_timeseries(
     """
     # fmt: on
     # pylint: enable=line-too-long
+    try:
+        import timeseries
+        import util
+    except ModuleNotFoundError:
+        import cupid.timeseries as timeseries
+        import cupid.util as util
+
     # Get control structure
     control = util.get_control_dict(config_path)
-    util.setup_book(config_path)
-    logger = util.setup_logging(config_path)
+    util.setup_book(config_path, control=control)
+    logger = util.setup_logging(config_path, control=control)
 
     component_options = {
         "atm": atmosphere,
@@ -87,17 +85,13 @@ def run_timeseries(
 
     # Automatically run all if no components specified
 
-    if True not in [atmosphere, ocean, land, seaice, landice, river_runoff]:
-        for key in component_options.keys():
-            component_options[key] = True
+    if not any(component_options.values()):
+        component_options = dict.fromkeys(component_options, True)
 
     #####################################################################
     # Managing global parameters
 
-    global_params = dict()
-
-    if "global_params" in control:
-        global_params = control["global_params"]
+    global_params = control.get("global_params", dict())
 
     global_params["serial"] = serial
 
@@ -107,87 +101,77 @@ def run_timeseries(
 
     # general timeseries arguments for all components
     num_procs = timeseries_params["num_procs"]
-
+    case_names = timeseries_params["case_name"]
+    case_list = case_names if isinstance(case_names, list) else [case_names]
+    cesm_output_dir = global_params["CESM_output_dir"]
+
+    # root directories of the history files and time series for each case;
+    # these do not depend on the component, so only build them once
+    # -----
+    if isinstance(case_names, list):
+        base_case_name = global_params.get("base_case_name")
+        base_case_output_dir = global_params.get("base_case_output_dir")
+        hist_roots = [
+            base_case_output_dir
+            if cname == base_case_name and base_case_output_dir is not None
+            else cesm_output_dir
+            for cname in case_names
+        ]
+    else:
+        hist_roots = [cesm_output_dir]
+
+    if "ts_output_dir" in timeseries_params:
+        ts_roots = timeseries_params["ts_output_dir"]
+        if not isinstance(ts_roots, list):
+            ts_roots = [ts_roots]
+    else:
+        ts_roots = [f"{cesm_output_dir}/{cname}" for cname in case_list]
+    # -----
+
+    # the ncrcat commands of all components are collected first and then run
+    # on a single pool of num_procs workers, so no processor sits idle while
+    # a component with many variables still has commands waiting
+    list_of_commands = []
     for component, comp_bool in component_options.items():
         if comp_bool:
+            comp_params = timeseries_params[component]
 
             # set time series input and output directory:
             # -----
-            if isinstance(timeseries_params["case_name"], list):
-                ts_input_dirs = []
-                for cname in timeseries_params["case_name"]:
-                    if cname == global_params["base_case_name"] and "base_case_output_dir" in global_params:
-                        ts_input_dirs.append(global_params["base_case_output_dir"]+"/"+cname+f"/{component}/hist/")
-                    else:
-                        ts_input_dirs.append(global_params["CESM_output_dir"]+"/"+cname+f"/{component}/hist/")
-            else:
-                ts_input_dirs = [
-                    global_params["CESM_output_dir"] + "/" +
-                    timeseries_params["case_name"] + f"/{component}/hist/",
-                ]
-
-            if "ts_output_dir" in timeseries_params:
-                if isinstance(timeseries_params["ts_output_dir"], list):
-                    ts_output_dirs = []
-                    for ts_outdir in timeseries_params["ts_output_dir"]:
-                        ts_output_dirs.append([
-                            os.path.join(
-                                    ts_outdir,
-                                    f"{component}", "proc", "tseries",
-                            ),
-                        ])
-                else:
-                    ts_output_dirs = [
-                        os.path.join(
-                                timeseries_params["ts_output_dir"],
-                                f"{component}", "proc", "tseries",
-                        ),
-                    ]
-            else:
-                if isinstance(timeseries_params["case_name"], list):
-                    ts_output_dirs = []
-                    for cname in timeseries_params["case_name"]:
-                        ts_output_dirs.append(
-                            os.path.join(
-                                    global_params["CESM_output_dir"],
-                                    cname,
-                                    f"{component}", "proc", "tseries",
-                            ),
-                        )
-                else:
-                    ts_output_dirs = [
-                        os.path.join(
-                                global_params["CESM_output_dir"],
-                                timeseries_params["case_name"],
-                                f"{component}", "proc", "tseries",
-                        ),
-                    ]
+            ts_input_dirs = [
+                f"{hist_root}/{cname}/{component}/hist/"
+                for hist_root, cname in zip(hist_roots, case_list)
+            ]
+            ts_output_dirs = [
+                f"{ts_root}/{component}/proc/tseries" for ts_root in ts_roots
+            ]
             # -----
 
             # fmt: off
             # pylint: disable=line-too-long
-            timeseries.create_time_series(
+            list_of_commands += timeseries.time_series_commands(
                 component,
-                timeseries_params[component]["vars"],
-                timeseries_params[component]["derive_vars"],
-                timeseries_params["case_name"],
-                timeseries_params[component]["hist_str"],
+                comp_params["vars"],
+                comp_params["derive_vars"],
+                case_names,
+                comp_params["hist_str"],
                 ts_input_dirs,
                 ts_output_dirs,
                 # Note that timeseries output will eventually go in
                 #   /glade/derecho/scratch/${USER}/archive/${CASE}/${component}/proc/tseries/
                 timeseries_params["ts_done"],
                 timeseries_params["overwrite_ts"],
-                timeseries_params[component]["start_years"],
-                timeseries_params[component]["end_years"],
-                timeseries_params[component]["level"],
-                num_procs,
-                serial,
+                comp_params["start_years"],
+                comp_params["end_years"],
+                comp_params["level"],
                 logger,
             )
             # fmt: on
             # pylint: enable=line-too-long
 
+    timeseries.run_ncrcat_commands(list_of_commands, num_procs, serial)
+    logger.info("  ... time series file generation has finished successfully.")
+
     return None
 
 
@@ -6,25 +6,24 @@ Timeseries generation tool adapted from ADF for general CUPiD use.
 # ++++++++++++++++++++++++++++++
 from __future__ import annotations
 
-import glob
-import multiprocessing as mp
+import fnmatch
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import xarray as xr
 
 
 def call_ncrcat(cmd):
-    """This is an internal function to `create_time_series`
-    It just wraps the subprocess.call() function, so it can be
-    used with the multiprocessing Pool that is constructed below.
-    It is declared as global to avoid AttributeError.
+    """This is an internal function to `run_ncrcat_commands`
+    It just wraps the subprocess.run() function, so it can be
+    used with a thread pool.
     """
     return subprocess.run(cmd, shell=False)
 
 
-def create_time_series(
+def time_series_commands(
     component,
     diag_var_list,
     derive_vars,
@@ -37,57 +36,24 @@ def create_time_series(
     start_years,
     end_years,
     height_dim,
-    num_procs,
-    serial,
     logger,
 ):
     """
-    Generate time series versions of the history file data.
-
-    Args
-    ----
-     - component: str
-         name of component, eg 'cam'
-         # This could also be made into a dict and encorporate values such as height_dim
-     - derive_vars: dict
-         information on derivable variables
-         eg, {'PRECT': ['PRECL','PRECC'],
-              'RESTOM': ['FLNT','FSNT']}
-     - case_names: list, str
-         name of simulaton case
-     - hist_str: str
-         CESM history number, ie h0, h1, etc.
-     - hist_locs: list, str
-         location of CESM history files
-     - ts_dir: list, str
-         location where time series files will be saved, or pre-made time series files exist
-     - ts_done: list, boolean
-         check if time series files already exist
-     - overwrite_ts: list, boolean
-         check if existing time series files will bew overwritten
-     - start_years: list, str or int
-         first year for desired range of years
-     - end_years: list, str or int
-         last year for desired range of years
-     - height_dim: str
-         name of height dimension for given component, eg 'lev'
-     - num_procs: int
-         number of processors
-     - diag_var_list: list
-         list of variables to create diagnostics (or timeseries) from
-     - serial: bool
-         if True, run in serial; if False, run in parallel
-
+    Return the "ncrcat" commands that generate time series versions of the
+    history file data, without running them; see create_time_series for the
+    arguments. Derived variables are computed here.
     """
 
     # Don't do anything if list of requested diagnostics is empty
     if not diag_var_list:
         logger.info(f"\n  No time series files requested for {component}...")
-        return
+        return []
 
     # Notify user that script has started:
     logger.info(f"\n  Generating {component} time series files...")
 
+    all_commands = []
+
     # Loop over cases:
     for case_idx, case_name in enumerate(case_names):
         # Check if particular case should be processed:
@@ -117,28 +83,30 @@ def create_time_series(
             raise FileNotFoundError(emsg)
         # End if
 
+        # List the history files once; the per-year selection below is done
+        # in memory rather than with another directory scan per year:
+        all_hist_files = list(starting_location.glob("*" + hist_str + ".*.nc"))
+
         # Check if history files actually exist. If not then kill script:
-        if not list(starting_location.glob("*" + hist_str + ".*.nc")):
+        if not all_hist_files:
             emsg = f"No history *{hist_str}.*.nc files found in '{starting_location}'."
             emsg += " Script is ending here."
             raise FileNotFoundError(emsg)
         # End if
 
-        # Create empty list:
-        files_list = []
-
-        # Loop over start and end years:
-        for year in range(start_year, end_year + 1):
-            # Add files to main file list:
-            for fname in starting_location.glob(
-                f"*{hist_str}.*{str(year).zfill(4)}*.nc",
-            ):
-                files_list.append(fname)
-            # End for
-        # End for
-
-        # Create ordered list of CAM history files:
-        hist_files = sorted(files_list)
+        # Patterns matching the files for each year between start and end years:
+        year_patterns = [
+            f"*{hist_str}.*{str(year).zfill(4)}*.nc"
+            for year in range(start_year, end_year + 1)
+        ]
+
+        # Create ordered list of CAM history files (each file only once, even
+        # if its name matches more than one year):
+        hist_files = sorted(
+            fname
+            for fname in all_hist_files
+            if any(fnmatch.fnmatchcase(fname.name, pat) for pat in year_patterns)
+        )
 
         # Open an xarray dataset from the first model history file:
         hist_file_ds = xr.open_dataset(
@@ -149,6 +117,7 @@ def create_time_series(
 
         # Get a list of data variables in the 1st hist file:
         hist_file_var_list = list(hist_file_ds.data_vars)
+        hist_file_vars = set(hist_file_var_list)
         # Note: could use `open_mfdataset`, but that can become very slow;
         #      This approach effectively assumes that all files contain the same variables.
 
@@ -211,6 +180,13 @@ def create_time_series(
         # Use pathlib to create parent directories, if necessary.
         Path(ts_dir[case_idx]).mkdir(parents=True, exist_ok=True)
 
+        # Existing time series files are only needed if they may not be
+        # over-written; list the directory once rather than once per variable:
+        if overwrite_ts[case_idx]:
+            existing_ts_files = set()
+        else:
+            existing_ts_files = set(os.listdir(ts_dir[case_idx]))
+
         # INPUT NAME TEMPLATE: $CASE.$scomp.[$type.][$string.]$date[$ending]
         first_file_split = str(hist_files[0]).split(".")
         if first_file_split[-1] == "nc":
@@ -224,7 +200,44 @@ def create_time_series(
             time_string_finish = last_file_split[-1].replace("-", "")
         time_string = "-".join([time_string_start, time_string_finish])
 
+        # Extra variables needed by every variable with a vertical dimension;
+        # these only depend on the history file, so determine them once:
+        # For now, only add these variables if using CAM
+        # (could also use if "cam" in component):
+        lev_var_list = ""
+        if vert_coord_type and "cam" in hist_str:
+            # PS might be in a different history file. If so, continue without error.
+            lev_var_list = ",hyam,hybm,hyai,hybi"
+
+            if "PS" in hist_file_vars:
+                lev_var_list = lev_var_list + ",PS"
+                logger.info("Adding PS to files with a vertical dimension")
+            else:
+                wmsg = "WARNING: PS not found in history file."
+                wmsg += " It might be needed at some point."
+                logger.warning(wmsg)
+            # End if
+
+            if vert_coord_type == "height":
+                # Adding PMID here works, but significantly increases
+                # the storage (disk usage) requirements of the ADF.
+                # This can be alleviated in the future by figuring out
+                # a way to determine all of the regridding targets at
+                # the start of the ADF run, and then regridding a single
+                # PMID file to each one of those targets separately. -JN
+                if "PMID" in hist_file_vars:
+                    lev_var_list = lev_var_list + ",PMID"
+                    logger.info("Adding PMID to files with a vertical dimension")
+                else:
+                    wmsg = "WARNING: PMID not found in history file."
+                    wmsg += " It might be needed at some point."
+                    logger.warning(wmsg)
+                # End if PMID
+            # End if height
+        # End if cam
+
         # Loop over history variables:
+        case_ts_dir = ts_dir[case_idx]
         list_of_commands = []
         vars_to_derive = []
         # create copy of var list that can be modified for derivable variables
@@ -233,7 +246,7 @@ def create_time_series(
             # TODO: this does not seem to be working for ocn...
             diag_var_list = hist_file_var_list
         for var in diag_var_list:
-            if var not in hist_file_var_list:
+            if var not in hist_file_vars:
                 if component == "ocn":
                     logger.warning(
                         "ocean vars seem to not be present in all files and thus cause errors",
@@ -253,26 +266,18 @@ def create_time_series(
                 logger.warning(msg)
                 continue
 
-            # Check if variable has a height_dim (eg, 'lev') dimension according to first file:
-            has_lev = bool(height_dim in hist_file_ds[var].dims)
+            var_dims = hist_file_ds[var].dims
 
             # Create full path name, file name template:
             # $cam_case_name.$hist_str.$variable.YYYYMM-YYYYMM.nc
 
-            ts_outfil_str = (
-                ts_dir[case_idx]
-                + os.sep
-                + ".".join([case_name, hist_str, var, time_string, "nc"])
-            )
-
-            # Check if files already exist in time series directory:
-            ts_file_list = glob.glob(ts_outfil_str)
+            ts_outfil_name = ".".join([case_name, hist_str, var, time_string, "nc"])
+            ts_outfil_str = case_ts_dir + os.sep + ts_outfil_name
 
-            # If files exist, then check if over-writing is allowed:
-            if ts_file_list:
-                if not overwrite_ts[case_idx]:
-                    # If not, then simply skip this variable:
-                    continue
+            # If the file already exists and over-writing is not allowed,
+            # then simply skip this variable:
+            if ts_outfil_name in existing_ts_files:
+                continue
 
             # Notify user of new time series file:
             logger.info(f"\t - time series for {var}")
@@ -281,44 +286,14 @@ def create_time_series(
             ncrcat_var_list = f"{var}"
 
             # Determine "ncrcat" command to generate time series file:
-            if "date" in hist_file_ds[var].dims:
+            if "date" in var_dims:
                 ncrcat_var_list = ncrcat_var_list + ",date"
-            if "datesec" in hist_file_ds[var].dims:
+            if "datesec" in var_dims:
                 ncrcat_var_list = ncrcat_var_list + ",datesec"
 
-            if has_lev and vert_coord_type:
-                # For now, only add these variables if using CAM:
-                if "cam" in hist_str:  # Could also use if "cam" in component
-                    # PS might be in a different history file. If so, continue without error.
-                    ncrcat_var_list = ncrcat_var_list + ",hyam,hybm,hyai,hybi"
-
-                    if "PS" in hist_file_var_list:
-                        ncrcat_var_list = ncrcat_var_list + ",PS"
-                        logger.info("Adding PS to file")
-                    else:
-                        wmsg = "WARNING: PS not found in history file."
-                        wmsg += " It might be needed at some point."
-                        logger.warning(wmsg)
-                    # End if
-
-                    if vert_coord_type == "height":
-                        # Adding PMID here works, but significantly increases
-                        # the storage (disk usage) requirements of the ADF.
-                        # This can be alleviated in the future by figuring out
-                        # a way to determine all of the regridding targets at
-                        # the start of the ADF run, and then regridding a single
-                        # PMID file to each one of those targets separately. -JN
-                        if "PMID" in hist_file_var_list:
-                            ncrcat_var_list = ncrcat_var_list + ",PMID"
-                            logger.info("Adding PMID to file")
-                        else:
-                            wmsg = "WARNING: PMID not found in history file."
-                            wmsg += " It might be needed at some point."
-                            logger.warning(wmsg)
-                        # End if PMID
-                    # End if height
-                # End if cam
-            # End if has_lev
+            # Check if variable has a height_dim (eg, 'lev') dimension according to first file:
+            if height_dim in var_dims:
+                ncrcat_var_list = ncrcat_var_list + lev_var_list
 
             cmd = (
                 ["ncrcat", "-O", "-4", "-h", "--no_cll_mth", "-v", ncrcat_var_list]
@@ -331,24 +306,114 @@ def create_time_series(
 
         # End variable loop
 
+        # The first history file is no longer needed; close it so its file
+        # descriptors are not inherited by the ncrcat subprocesses
+        hist_file_ds.close()
+
         if vars_to_derive:
             if component == "atm":
                 derive_cam_variables(
                     logger,
                     vars_to_derive=vars_to_derive,
-                    ts_dir=ts_dir[case_idx],
+                    ts_dir=case_ts_dir,
                 )
 
-        if serial:
-            for cmd in list_of_commands:
-                call_ncrcat(cmd)
-        else:  # if not serial
-            # Now run the "ncrcat" subprocesses in parallel:
-            with mp.Pool(processes=num_procs) as mpool:
-                _ = mpool.map(call_ncrcat, list_of_commands)
-            # End with
+        all_commands.extend(list_of_commands)
     # End cases loop
 
+    return all_commands
+
+
+def run_ncrcat_commands(list_of_commands, num_procs, serial):
+    """
+    Run "ncrcat" commands, one at a time if serial and otherwise num_procs at once.
+    """
+    if serial:
+        for cmd in list_of_commands:
+            call_ncrcat(cmd)
+    else:  # if not serial
+        # Now run the "ncrcat" subprocesses in parallel; the threads just wait
+        # on the subprocesses, so there is no need to fork worker processes:
+        with ThreadPoolExecutor(max_workers=num_procs) as executor:
+            _ = list(executor.map(call_ncrcat, list_of_commands))
+        # End with
+
+
+def create_time_series(
+    component,
+    diag_var_list,
+    derive_vars,
+    case_names,
+    hist_str,
+    hist_locs,
+    ts_dir,
+    ts_done,
+    overwrite_ts,
+    start_years,
+    end_years,
+    height_dim,
+    num_procs,
+    serial,
+    logger,
+):
+    """
+    Generate time series versions of the history file data.
+
+    Args
+    ----
+     - component: str
+         name of component, eg 'cam'
+         # This could also be made into a dict and encorporate values such as height_dim
+     - derive_vars: dict
+         information on derivable variables
+         eg, {'PRECT': ['PRECL','PRECC'],
+              'RESTOM': ['FLNT','FSNT']}
+     - case_names: list, str
+         name of simulaton case
+     - hist_str: str
+         CESM history number, ie h0, h1, etc.
+     - hist_locs: list, str
+         location of CESM history files
+     - ts_dir: list, str
+         location where time series files will be saved, or pre-made time series files exist
+     - ts_done: list, boolean
+         check if time series files already exist
+     - overwrite_ts: list, boolean
+         check if existing time series files will bew overwritten
+     - start_years: list, str or int
+         first year for desired range of years
+     - end_years: list, str or int
+         last year for desired range of years
+     - height_dim: str
+         name of height dimension for given component, eg 'lev'
+     - num_procs: int
+         number of processors
+     - diag_var_list: list
+         list of variables to create diagnostics (or timeseries) from
+     - serial: bool
+         if True, run in serial; if False, run in parallel
+
+    """
+    list_of_commands = time_series_commands(
+        component,
+        diag_var_list,
+        derive_vars,
+        case_names,
+        hist_str,
+        hist_locs,
+        ts_dir,
+        ts_done,
+        overwrite_ts,
+        start_years,
+        end_years,
+        height_dim,
+        logger,
+    )
+    if not diag_var_list:
+        return
+
+    run_ncrcat_commands(list_of_commands, num_procs, serial)
+
     # Notify user that script has ended:
     logger.info(
         f"  ... {component} time series file generation has finished successfully.",
@@ -366,14 +431,21 @@ def derive_cam_variables(logger, vars_to_derive=None, ts_dir=None, overwrite=Non
     whether to overwrite the file (true) or exit with a warning message.
     """
 
+    # List the time series directory once rather than globbing it for every
+    # constituent (glob skips hidden files, so do the same here):
+    ts_files = sorted(name for name in os.listdir(ts_dir) if not name.startswith("."))
+
+    def ts_paths(pattern):
+        return [
+            os.path.join(ts_dir, name) for name in fnmatch.filter(ts_files, pattern)
+        ]
+
     for var in vars_to_derive:
         if var == "PRECT":
             # PRECT can be found by simply adding PRECL and PRECC
             # grab file names for the PRECL and PRECC files from the case ts directory
-            if glob.glob(os.path.join(ts_dir, "*PRECC*")) and glob.glob(
-                os.path.join(ts_dir, "*PRECL*"),
-            ):
-                constit_files = sorted(glob.glob(os.path.join(ts_dir, "*PREC*")))
+            if ts_paths("*PRECC*") and ts_paths("*PRECL*"):
+                constit_files = ts_paths("*PREC*")
             else:
                 ermsg = (
                     "PRECC and PRECL were not both present; PRECT cannot be calculated."
@@ -381,33 +453,27 @@ def derive_cam_variables(logger, vars_to_derive=None, ts_dir=None, overwrite=Non
                 ermsg += " Please remove PRECT from diag_var_list or find the relevant CAM files."
                 raise FileNotFoundError(ermsg)
             # create new file name for PRECT
-        prect_file = constit_files[0].replace("PRECC", "PRECT")
-        if Path(prect_file).is_file():
-            if overwrite:
-                Path(prect_file).unlink()
-            else:
-                logger.warning(
-                    f"[{__name__}] Warning: PRECT file was found and overwrite is False"
-                    + "Will use existing file.",
-                )
-                continue
-        # append PRECC to the file containing PRECL
-        os.system(f"ncks -A -v PRECC {constit_files[0]} {constit_files[1]}")
-        # create new file with the sum of PRECC and PRECL
-        os.system(f"ncap2 -s 'PRECT=(PRECC+PRECL)' {constit_files[1]} {prect_file}")
+            prect_file = constit_files[0].replace("PRECC", "PRECT")
+            if Path(prect_file).is_file():
+                if overwrite:
+                    Path(prect_file).unlink()
+                else:
+                    logger.warning(
+                        f"[{__name__}] Warning: PRECT file was found and overwrite is False"
+                        + "Will use existing file.",
+                    )
+                    continue
+            # append PRECC to the file containing PRECL
+            os.system(f"ncks -A -v PRECC {constit_files[0]} {constit_files[1]}")
+            # create new file with the sum of PRECC and PRECL
+            os.system(
+                f"ncap2 -s 'PRECT=(PRECC+PRECL)' {constit_files[1]} {prect_file}",
+            )
         if var == "RESTOM":
             # RESTOM = FSNT-FLNT
             # Have to be more precise than with PRECT because FSNTOA, FSTNC, etc are valid variables
-            if glob.glob(os.path.join(ts_dir, "*.FSNT.*")) and glob.glob(
-                os.path.join(ts_dir, "*.FLNT.*"),
-            ):
-                input_files = [
-                    sorted(glob.glob(os.path.join(ts_dir, f"*.{v}.*")))
-                    for v in ["FLNT", "FSNT"]
-                ]
-                constit_files = []
-                for elem in input_files:
-                    constit_files += elem
+            if ts_paths("*.FSNT.*") and ts_paths("*.FLNT.*"):
+                constit_files = ts_paths("*.FLNT.*") + ts_paths("*.FSNT.*")
             else:
                 ermsg = (
                     "FSNT and FLNT were not both present; RESTOM cannot be calculated."
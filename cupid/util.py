@@ -29,6 +29,14 @@ import yaml
 from jinja2 import Template
 from papermill.engines import NBClientEngine
 
+try:
+    from read import read_yaml
+except ModuleNotFoundError:
+    from cupid.read import read_yaml
+
+# Use the libyaml-backed dumper when PyYAML was built with it
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
 
 class MarkdownJinjaEngine(NBClientEngine):
     """Class for using the Jinja Engine to run notebooks"""
@@ -36,7 +44,7 @@ class MarkdownJinjaEngine(NBClientEngine):
     @classmethod
     def execute_managed_notebook(cls, nb_man, kernel_name, **kwargs):
         """Execute notebooks with papermill execution engine"""
-        jinja_data = {} if "jinja_data" not in kwargs else kwargs["jinja_data"]
+        jinja_data = kwargs.get("jinja_data", {})
 
         # call the papermill execution engine:
         super().execute_managed_notebook(nb_man, kernel_name, **kwargs)
@@ -50,8 +58,7 @@ def get_control_dict(config_path):
     """Get control dictionary from configuration file"""
 
     try:
-        with open(config_path) as fid:
-            control = yaml.safe_load(fid)
+        control = read_yaml(config_path)
     except FileNotFoundError:
         print(f"ERROR: {config_path} not found")
         sys.exit(1)
@@ -59,50 +66,58 @@ def get_control_dict(config_path):
     default_kernel_name = control["computation_config"].pop("default_kernel_name", None)
 
     control["env_check"] = dict()
+    # notebooks and scripts that fall back to cupid-analysis, reported in one warning
+    no_kernel = []
 
-    if "compute_notebooks" in control:
-        for nb_category in control["compute_notebooks"].values():
+    compute_notebooks = control.get("compute_notebooks")
+    if compute_notebooks is not None:
+        for nb_category in compute_notebooks.values():
             # pylint: disable=invalid-name
             for nb, info in nb_category.items():
                 info["kernel_name"] = info.get("kernel_name", default_kernel_name)
                 if info["kernel_name"] is None:
                     info["kernel_name"] = "cupid-analysis"
-                    warnings.warn(
-                        f"No conda environment specified for {nb}.ipynb and"
-                        + " no default kernel set, will use cupid-analysis environment.",
-                    )
+                    no_kernel.append(f"{nb}.ipynb")
                 if info["kernel_name"] not in control["env_check"]:
                     control["env_check"][info["kernel_name"]] = (
                         info["kernel_name"]
                         in jupyter_client.kernelspec.find_kernel_specs()
                     )
 
-    if "compute_scripts" in control:
-        for script_category in control["compute_scripts"].values():
+    compute_scripts = control.get("compute_scripts")
+    if compute_scripts is not None:
+        for script_category in compute_scripts.values():
             for script, info in script_category.items():
                 info["kernel_name"] = info.get("kernel_name", default_kernel_name)
                 if info["kernel_name"] is None:
                     info["kernel_name"] = "cupid-analysis"
-                    warnings.warn(
-                        f"No environment specified for {script}.py and no default"
-                        + " kernel set, will use cupid-analysis environment.",
-                    )
+                    no_kernel.append(f"{script}.py")
                 if info["kernel_name"] not in control["env_check"]:
                     control["env_check"][info["kernel_name"]] = (
                         info["kernel_name"]
                         in jupyter_client.kernelspec.find_kernel_specs()
                     )
 
+    if no_kernel:
+        warnings.warn(
+            "No conda environment specified for "
+            + ", ".join(no_kernel)
+            + " and no default kernel set, will use cupid-analysis environment.",
+        )
+
     return control
 
 
-def setup_logging(config_path):
+def setup_logging(config_path, control=None):
     """
     Set up logging based on configuration file log level
     Options for log levels include debug, info, warning, and error.
+    Pass the control dict from get_control_dict() as control to avoid
+    reading the configuration file again.
     Returns logger object
     """
-    control = get_control_dict(config_path)
+    if control is None:
+        control = get_control_dict(config_path)
     # default level is info if log level is not set in config
     log_level = control["computation_config"].get("log_level", "info")
     if log_level == "debug" or log_level == "DEBUG":
@@ -130,10 +145,15 @@ def setup_logging(config_path):
     return logging.getLogger(__name__)
 
 
-def setup_book(config_path):
-    """Setup run directory and output jupyter book"""
+def setup_book(config_path, control=None):
+    """
+    Setup run directory and output jupyter book
+    Pass the control dict from get_control_dict() as control to avoid
+    reading the configuration file again.
+    """
 
-    control = get_control_dict(config_path)
+    if control is None:
+        control = get_control_dict(config_path)
 
     # ensure directory
     run_dir = os.path.expanduser(control["data_sources"]["run_dir"])
@@ -153,21 +173,20 @@ def setup_book(config_path):
     # write table of contents file
     toc = control["book_toc"]
     with open(f"{output_dir}/_toc.yml", "w+") as fid:
-        yaml.dump(toc, fid, sort_keys=False)
+        yaml.dump(toc, fid, Dumper=_YAML_DUMPER, sort_keys=False)
 
     # read config defaults
 
     path_to_here = os.path.dirname(os.path.realpath(__file__))
 
-    with open(f"{path_to_here}/_jupyter-book-config-defaults.yml") as fid:
-        config = yaml.safe_load(fid)
+    config = read_yaml(f"{path_to_here}/_jupyter-book-config-defaults.yml")
 
     # update defaults
     config.update(control["book_config_keys"])
 
     # write config file
     with open(f"{output_dir}/_config.yml", "w") as fid:
-        yaml.dump(config, fid, sort_keys=False)
+        yaml.dump(config, fid, Dumper=_YAML_DUMPER, sort_keys=False)
 
     return None
 
@@ -202,14 +221,9 @@ def create_ploomber_nb_task(
     parameter_groups = info["parameter_groups"]
 
     # passing in subset kwargs if they're provided
-    if "subset" in info:
-        subset_kwargs = info["subset"]
-    else:
-        subset_kwargs = {}
+    subset_kwargs = info.get("subset", {})
 
-    default_params = {}
-    if "default_params" in info:
-        default_params = info["default_params"]
+    default_params = info.get("default_params", {})
 
     for key, parms in parameter_groups.items():
         input_path = f"{nb_path_root}/{nb}.ipynb"
@@ -284,14 +298,9 @@ def create_ploomber_script_task(
     parameter_groups = info["parameter_groups"]
 
     # passing in subset kwargs if they're provided
-    if "subset" in info:
-        subset_kwargs = info["subset"]
-    else:
-        subset_kwargs = {}
+    subset_kwargs = info.get("subset", {})
 
-    default_params = {}
-    if "default_params" in info:
-        default_params = info["default_params"]
+    default_params = info.get("default_params", {})
 
     for key, parms in parameter_groups.items():
         input_path = f"{nb_path_root}/{script}.py"
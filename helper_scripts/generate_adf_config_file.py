@@ -7,6 +7,10 @@ import sys
 
 import yaml
 
+# Use the libyaml-backed loader / dumper when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
 
 def _parse_args():
     """Parse command line arguments"""
@@ -60,9 +64,9 @@ def generate_adf_config(cesm_root, cupid_config_loc, adf_file, out_file):
         raise KeyError(f"Can not find config.yml in {cupid_config_loc}")
 
     with open(os.path.join(cupid_config_loc, "config.yml")) as c:
-        c_dict = yaml.safe_load(c)
+        c_dict = yaml.load(c, Loader=_YAML_LOADER)
     with open(adf_file, encoding="UTF-8") as a:
-        a_dict = yaml.safe_load(a)
+        a_dict = yaml.load(a, Loader=_YAML_LOADER)
 
     # read parameters from CUPID
     # use `get` to default to None
@@ -241,19 +245,20 @@ def generate_adf_config(cesm_root, cupid_config_loc, adf_file, out_file):
 
     # os.getenv("USER")
 
+    # Header of file is a comment logging provenance
+    header = (
+        "# This file has been auto-generated using generate_adf_config_file.py\n"
+        f"# It is based off of {cupid_config_loc}/config.yml\n"
+        "# Arguments:\n"
+        f"# {cesm_root=}\n"
+        f"# {cupid_config_loc=}\n"
+        f"# {adf_file=}\n"
+        f"# Output: {out_file=}\n"
+    )
+    # serialize each element of the dictionary up front so the file is written once
+    body = yaml.dump(a_dict, Dumper=_YAML_DUMPER, sort_keys=False)
     with open(out_file, "w") as f:
-        # Header of file is a comment logging provenance
-        f.write(
-            "# This file has been auto-generated using generate_adf_config_file.py\n",
-        )
-        f.write(f"# It is based off of {cupid_config_loc}/config.yml\n")
-        f.write("# Arguments:\n")
-        f.write(f"# {cesm_root=}\n")
-        f.write(f"# {cupid_config_loc=}\n")
-        f.write(f"# {adf_file=}\n")
-        f.write(f"# Output: {out_file=}\n")
-        # enter in each element of the dictionary into the new file
-        yaml.dump(a_dict, f, sort_keys=False)
+        f.write(header + body)
 
 
 def get_date_from_ts(data: dict, keyname: str, listindex: int, default=None):
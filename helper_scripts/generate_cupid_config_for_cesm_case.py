@@ -7,6 +7,10 @@ import sys
 
 import yaml
 
+# Use the libyaml-backed loader / dumper when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
 
 def _parse_args():
     """Parse command line arguments"""
@@ -119,7 +123,7 @@ def generate_cupid_config(case_root, cesm_root, cupid_example):
     base_climo_nyears = 40
 
     with open(os.path.join(cupid_root, "examples", cupid_example, "config.yml")) as f:
-        my_dict = yaml.safe_load(f)
+        my_dict = yaml.load(f, Loader=_YAML_LOADER)
 
     my_dict["data_sources"]["nb_path_root"] = os.path.join(
         cesm_root,
@@ -157,17 +161,19 @@ def generate_cupid_config(case_root, cesm_root, cupid_example):
     my_dict["global_params"]["CESM_output_dir"] = os.path.dirname(dout_s_root)
 
     # create new file, make it writeable
+    # Header of file is a comment logging provenance
+    header = (
+        f"# This file has been auto-generated for use with {case}\n"
+        f"# It is based off of examples/{cupid_example}/config.yml\n"
+        "# Arguments used:\n"
+        f"# cesm_root = {cesm_root}\n"
+        f"# case_root = {case_root}\n"
+        f"# cupid_example= {cupid_example}\n"
+    )
+    # serialize each element of the dictionary up front so the file is written once
+    body = yaml.dump(my_dict, Dumper=_YAML_DUMPER, sort_keys=False)
     with open("config.yml", "w") as f:
-        # Header of file is a comment logging provenance
-        f.write(f"# This file has been auto-generated for use with {case}\n")
-        f.write(f"# It is based off of examples/{cupid_example}/config.yml\n")
-        f.write("# Arguments used:\n")
-        f.write(f"# cesm_root = {cesm_root}\n")
-        f.write(f"# case_root = {case_root}\n")
-        f.write(f"# cupid_example= {cupid_example}\n")
-
-        # enter in each element of the dictionary into the new file
-        yaml.dump(my_dict, f, sort_keys=False)
+        f.write(header + body)
 
 
 if __name__ == "__main__":
@@ -18,11 +18,14 @@ try:
 except ImportError:
     pass  # or anything to log
 
+# use the libyaml-backed loader when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 def load_yaml(yaml_file) -> dict:
     """Load yaml data from file"""
     with open(yaml_file) as ymlfile:
-        return yaml.load(ymlfile, Loader=yaml.FullLoader)
+        return yaml.load(ymlfile, Loader=_YAML_LOADER)
 
 
 class AutoVivification(dict):